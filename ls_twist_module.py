@@ -17,6 +17,58 @@ import logging
 logger = logging.getLogger(__name__) 
 logger.setLevel(logging.DEBUG)
 
+# Stored in the AdvancedTwist LOD script node, it is executed every time the scene is opened.
+# It must not depend on this module, the rig can be opened where ls_twist_module is not available.
+_LOD_CALLBACK_SCRIPT = """
+import functools
+import __main__
+import maya.cmds as cmds
+
+
+def _ls_twist_lod_source(plug):
+    return cmds.listConnections(plug, source=True, destination=False)[0]
+
+
+def _ls_twist_lod_apply(node):
+    low = cmds.getAttr(node + ".lod") == 1
+    orient_nodes = cmds.listConnections(node + ".lodOrientNodes", source=True, destination=False) or []
+
+    if not low:
+        for orient_node in orient_nodes:
+            cmds.setAttr(orient_node + ".frozen", False)
+
+    for i in cmds.getAttr(node + ".lodLocators", multiIndices=True) or []:
+        loc = _ls_twist_lod_source("{}.lodLocators[{}]".format(node, i))
+        mpath = _ls_twist_lod_source("{}.lodMotionPaths[{}]".format(node, i))
+        interp = _ls_twist_lod_source("{}.lodInterps[{}]".format(node, i))
+
+        if low:
+            cmds.setAttr(interp + ".frozen", False)
+            cmds.connectAttr(interp + ".output", loc + ".translate", force=True)
+            cmds.setAttr(mpath + ".frozen", True)
+        else:
+            cmds.setAttr(mpath + ".frozen", False)
+            cmds.connectAttr(mpath + ".allCoordinates", loc + ".translate", force=True)
+            cmds.setAttr(interp + ".frozen", True)
+
+    if low:
+        for orient_node in orient_nodes:
+            cmds.setAttr(orient_node + ".frozen", True)
+
+    cmds.evaluationManager(invalidate=True)
+
+
+_ls_twist_lod_jobs = __main__.__dict__.setdefault("_ls_twist_lod_jobs", {})
+
+for _node in cmds.ls("*.lodLocators", objectsOnly=True, recursive=True) or []:
+    _job = _ls_twist_lod_jobs.get(_node)
+    if _job is not None and cmds.scriptJob(exists=_job):
+        continue
+
+    _ls_twist_lod_jobs[_node] = cmds.scriptJob(
+        attributeChange=[_node + ".lod", functools.partial(_ls_twist_lod_apply, _node)], killWithScene=True)
+"""
+
 class RigBaseModule(object):
     def __init__(self, side, module_name, debug):
         """
@@ -88,7 +140,9 @@ class NodeCreator():
             "multMatrix" : "MTX",
             "decomposeMatrix" : "DCMTX",
             "composeMatrix" : "CMTX",
-            "multDoubleLinear" : "MDL"
+            "multDoubleLinear" : "MDL",
+            "blendColors" : "BLC",
+            "script" : "SCR"
         }
 
     def create(self, node_type, side=None, description=None, token='', suffix=None):
@@ -116,9 +170,21 @@ class NodeCreator():
         return node
 
 class AdvancedTwist(RigBaseModule):
-    def __init__(self, side, module_name, debug, curve, start_trn, end_trn, aim_axis, num_outputs=5): 
+    def __init__(self, side, module_name, debug, curve, start_trn, end_trn, aim_axis, num_outputs=5, lod_step=1): 
         super(AdvancedTwist, self).__init__(side, module_name, debug) 
 
+        if not isinstance(num_outputs, int) or isinstance(num_outputs, bool):
+            raise TypeError("'num_outputs' must be of type integer")
+
+        if num_outputs < 2:
+            raise ValueError("'num_outputs' must be greater than 1")
+
+        if not isinstance(lod_step, int) or isinstance(lod_step, bool):
+            raise TypeError("'lod_step' must be of type integer")
+
+        if lod_step < 1:
+            raise ValueError("'lod_step' must be greater than 0")
+
         self._valid_axis = "X Y Z -X -Y -Z".split()
 
         aim_axis = aim_axis.upper()
@@ -131,11 +197,22 @@ class AdvancedTwist(RigBaseModule):
             'start_trn': start_trn,
             'end_trn': end_trn,
             'aim_axis': aim_axis,
-            'num_outputs' : num_outputs
+            'num_outputs' : num_outputs,
+            'lod_step' : lod_step
 
         }
 
+        # outputs evaluated in every LOD, the rest only in "High"
+        driver_indices = list(range(0, num_outputs, lod_step))
+        if driver_indices[-1] != num_outputs - 1:
+            driver_indices.append(num_outputs - 1)
+
         self._module_data = {
+            'lod_driver_indices' : driver_indices,
+            'motion_paths' : list(),
+            'locators' : list(),
+            'aim_constraints' : list(),
+            'increment_nodes' : list()
 
         }
 
@@ -170,6 +247,8 @@ class AdvancedTwist(RigBaseModule):
                
         self._aim_constraints()
 
+        self._create_lod_switch()
+
 
     def _create_inputs_and_outputs(self):
         inputs = self._output_data.get('inputs_trn')
@@ -240,6 +319,9 @@ class AdvancedTwist(RigBaseModule):
                 
                 mpath_base.allCoordinates >> loc_comp.translate
 
+                self._module_data['motion_paths'].append(mpath_base)
+                self._module_data['locators'].append(loc_comp)
+
     
    
     def _aim_constraints(self):
@@ -259,16 +341,65 @@ class AdvancedTwist(RigBaseModule):
             if i != num[-1]:
                 aim_con = pm.aimConstraint("loc_twist_{}".format(number_next), "loc_twist_{}".format(number), aim=(1,0,0), wut="none")
                 mult_dbl.output >> aim_con.offsetX
+                self._module_data['aim_constraints'].append(aim_con)
 
                                 
             else:
                 aim_con_rev = pm.aimConstraint("loc_twist_{}".format(number_last), "loc_twist_{}".format(number), aim=(-1,0,0), wut="none")
                 mult_dbl.output >> aim_con_rev.offsetX
-            
-                
-            
-            
-            
-            
-        
-                
\ No newline at end of file
+                self._module_data['aim_constraints'].append(aim_con_rev)
+
+            self._module_data['increment_nodes'].append(mult_dbl)
+
+    def _create_lod_switch(self):
+        """
+        Builds the "lod" attribute on "inputs_trn" and the nodes needed to cut the non driver
+        outputs from the evaluation:
+            High: every output follows its own motionPath, the interpolation nodes are frozen
+                and not connected, so the cost is the same as without LOD.
+            Freeze: the non driver motionPath, aimConstraint and multDoubleLinear nodes are frozen
+                and the non driver locators are moved by one blendColors interpolating the
+                neighbour drivers. The driver outputs keep evaluating and aiming at a live target.
+
+        The switch is done by _LOD_CALLBACK_SCRIPT, stored in a script node that runs on scene
+        open, so it also works when the rig is opened or referenced in another session.
+        """
+        drivers = self._module_data['lod_driver_indices']
+        if len(drivers) == self._input_data['num_outputs']:
+            return
+
+        inputs = self._output_data.get('inputs_trn')
+        pm.addAttr(inputs, ln="lod", at="enum", en="High:Freeze", k=False)
+        inputs.lod.set(cb=True)
+        pm.addAttr(inputs, ln="lodLocators", at="message", multi=True)
+        pm.addAttr(inputs, ln="lodMotionPaths", at="message", multi=True)
+        pm.addAttr(inputs, ln="lodInterps", at="message", multi=True)
+        pm.addAttr(inputs, ln="lodOrientNodes", at="message", multi=True)
+
+        motion_paths = self._module_data['motion_paths']
+
+        for i in range(self._input_data['num_outputs']):
+            if i in drivers:
+                continue
+
+            number = str(i).zfill(2)
+            prev_driver = max([d for d in drivers if d < i])
+            next_driver = min([d for d in drivers if d > i])
+
+            interp = self._nd.create("blendColors", token="LodInterp_{}".format(number))
+            motion_paths[next_driver].allCoordinates >> interp.color1
+            motion_paths[prev_driver].allCoordinates >> interp.color2
+            interp.blender.set(float(i - prev_driver) / (next_driver - prev_driver))
+            interp.frozen.set(True)
+
+            self._module_data['locators'][i].message >> inputs.lodLocators[i]
+            motion_paths[i].message >> inputs.lodMotionPaths[i]
+            interp.message >> inputs.lodInterps[i]
+            self._module_data['aim_constraints'][i].message >> inputs.lodOrientNodes[2 * i]
+            self._module_data['increment_nodes'][i].message >> inputs.lodOrientNodes[2 * i + 1]
+
+        script_node = self._nd.create("script", token="LodCallback")
+        script_node.before.set(_LOD_CALLBACK_SCRIPT)
+        script_node.sourceType.set(1) # python
+        script_node.scriptType.set(1) # open/close
+        pm.scriptNode(script_node, executeBefore=True)